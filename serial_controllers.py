@@ -1,8 +1,15 @@
 from abc import ABC, abstractmethod
-from time import sleep
-import xml.etree.ElementTree as et
-from datetime import datetime
+from array import array
+from contextlib import contextmanager, ExitStack
+from functools import partial
+import atexit
+from time import sleep, monotonic, strftime
+import os
+import sys
 import socket
+import asyncio
+import threading
+import weakref
 
 try:
     import serial
@@ -10,6 +17,18 @@ except ImportError as e:
     serial = None
     exc1 = e
 
+try:
+    from lxml import etree as et  # optional, parses the (tens of kB) GlOpticTouch responses with libxml2
+    lxml_found = True
+except ImportError:
+    import xml.etree.ElementTree as et
+    lxml_found = False
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class BaseDevice(ABC):
     """Prototype class for a device"""
@@ -17,6 +36,11 @@ class BaseDevice(ABC):
     DEFAULTS = dict()  # normally used to store communication settings matching to a specific device defaults
     MAX_CHANNELS = 1  # number of independent measurement channels or outputs present in the device. A
     # device with no selectable measurement channels/outputs is understood to be a 1 channel device.
+    _VALID_CHANNELS = frozenset(range(1, MAX_CHANNELS+1))  # recomputed by __init_subclass__ from MAX_CHANNELS
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._VALID_CHANNELS = frozenset(range(1, cls.MAX_CHANNELS+1))
 
     def __init__(self):
         """ Not much to do here beside eventual attribute assignment. Use initialize to establish the actual
@@ -24,10 +48,20 @@ class BaseDevice(ABC):
         self._port = None  # identification of physical / virtual port at which the hardware is found / assigned.
         self._rsc = None  # resource object for pushing communications (e.g. serial or TCP socket).
         self._id = 'UNKNOWN DEVICE'  # identification of the meas. instrument (e.g. IDN string or network IP address.).
+        self._lock = threading.RLock()  # held for every exchange with the device so that instances can be shared
+        # between threads (e.g. a ThreadPoolExecutor polling several devices) without interleaving their messages.
+        self._query_cache = dict()  # answers to _CACHED_QUERIES, valid until the resource is released.
 
     def __str__(self):
         return f'\nDevice model: {self._id} at Port {self._port} \n Communication settings: {self.DEFAULTS}'
 
+    def __enter__(self):
+        self.initialize()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.finalize()
+
     @abstractmethod
     def initialize(self):
         """ Establish communication / open port using instance or class attributes."""
@@ -86,6 +120,7 @@ class BaseDevice(ABC):
         -------
             None
         """
+        self._query_cache.clear()
         if self._rsc is not None:
             self._rsc.close()
             self._rsc = None
@@ -102,10 +137,7 @@ class BaseDevice(ABC):
         -------
 
         """
-        if 0 < channel <= self.MAX_CHANNELS:
-            return True
-        else:
-            return False
+        return channel in self._VALID_CHANNELS
 
     def _channel_arg_check(self, channel_s, expected_type=int):
         """
@@ -123,11 +155,13 @@ class BaseDevice(ABC):
         """
         self.type_check(channel_s, expected_type)
         
-        if self.is_iterable(channel_s):
-            for channel in channel_s:
-                self.type_check(channel, int)
-                if not self.channel_exists(channel):
-                    raise ValueError(f'This device does not support channel {channel}')
+        if isinstance(channel_s, int):
+            channel_s = (channel_s,)
+
+        for channel in channel_s:
+            self.type_check(channel, int)
+            if not self.channel_exists(channel):
+                raise ValueError(f'This device does not support channel {channel}')
 
     @staticmethod
     def type_check(an_object, expected_type):
@@ -154,6 +188,27 @@ class BaseDevice(ABC):
         return True
 
 
+class _SharedPort:
+    """ Open serial resource shared by all controllers initialized on the same port, together with the lock that keeps
+    their exchanges from interleaving. """
+
+    def __init__(self, rsc):
+        self.rsc = rsc
+        self.lock = threading.RLock()
+        self.users = 0
+        self.id = None  # identification of the device, known once the first controller has initialized
+        self.rx_buffer = bytearray()  # received bytes not yet consumed by SerialDevice._read
+        # outputs the user allowed to engage at their present levels (see _PsuMixin), kept here so that new levels set
+        # by any controller on the port withdraw the approval
+        self.approved_channels = set()
+
+
+_PORTS = weakref.WeakValueDictionary()  # port name -> _SharedPort, entries vanish with the last controller using them
+_PORTS_LOCK = threading.Lock()
+_IDLE_PORTS = set()  # _SharedPorts without users that keep_open controllers left open, see close_idle_ports
+_PROMPT_LOCK = threading.Lock()  # held while a controller prints its output levels and waits for the user's answer
+
+
 class SerialDevice(BaseDevice):
 
     """
@@ -162,6 +217,25 @@ class SerialDevice(BaseDevice):
     ----------
     port : str
         The port where the device is connected. Something like COM3 on Windows, or /dev/ttyACM0 on Linux
+    low_latency : bool
+        Request the low latency mode from the serial driver when the port is opened (Linux only). This removes the
+        latency timer wait (16 ms by default on FTDI USB-serial adapters) from every read.
+    baudrate : int
+        Overrides DEFAULTS['baudrate'] for instruments set up to communicate at a different (e.g. higher) baud rate.
+    quiet : bool
+        Skip the beep with which the device announces itself in initialize.
+    fast_timeout : float
+        Read timeout in seconds used in place of DEFAULTS['read_timeout'] once the device has identified itself, so that
+        queries left unanswered (e.g. by a mistyped command) do not block for the whole initial timeout.
+    cache_ttl : float
+        Time in seconds for which answers to rarely changing queries (e.g. the DMM unit from CONF?) are reused instead
+        of being asked again. Off by default, only enable it if nobody turns the knobs of the device meanwhile.
+    keep_open : bool
+        Leave the port open (with the device identified) when the last controller using it is finalized, so that the
+        next initialize on that port neither reopens it nor identifies the device again (e.g. between test cases).
+        Only the keep_open of the controller that finalizes last counts, the port is closed if that one was created
+        without it (also when an earlier user of the port had keep_open). Such idle ports are closed by
+        close_idle_ports() or at interpreter exit.
     Attributes
     ----------
     _rsc : serial
@@ -176,11 +250,40 @@ class SerialDevice(BaseDevice):
                 'baudrate': 9600,
                 'read_timeout': 1,
                 'write_timeout': 1,
+                'inter_byte_timeout': 0.05,  # silence after which a response without read_termination is complete
                 }
 
     MAX_CHANNELS = 2  # TODO not sure if there is any good reason to override here
 
-    def __init__(self, port):
+    # Side effect free queries with answers that can not change while the port is open, so they are only sent to the
+    # device once. Don't add queries such as CONF? here, DMM function can be changed with the front panel knob.
+    _CACHED_QUERIES = frozenset({'*IDN?', 'SYST:VERS?'})
+
+    _WAKE_UP_TIME = 0.5  # time in seconds a device may need after the port was opened before it answers requests
+
+    # encoded command templates for get_input and set_output, complete them with the % operator
+    _GET_INPUT = b'IN:CH%d'
+    _SET_OUTPUT = b'OUT:CH%d:%d'
+
+    # encoded DEFAULTS used by every exchange, recomputed by __init_subclass__ for subclasses with their own DEFAULTS
+    _ENC = DEFAULTS['encoding']
+    _WTERM_B = DEFAULTS['write_termination'].encode(_ENC)
+    _RTERM_B = DEFAULTS['read_termination'].encode(_ENC)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._ENC = cls.DEFAULTS['encoding']
+        cls._WTERM_B = cls.DEFAULTS['write_termination'].encode(cls._ENC)
+        cls._RTERM_B = cls.DEFAULTS['read_termination'].encode(cls._ENC)
+        cls._encode_messages()
+
+    @classmethod
+    def _encode_messages(cls):
+        """ Hook for subclasses to prebuild fixed messages once their DEFAULTS and MAX_CHANNELS are known. """
+        pass
+
+    def __init__(self, port, low_latency=False, baudrate=None, quiet=False, fast_timeout=None, cache_ttl=0.0,
+                 keep_open=False):
 
         # Remind user to install serial package to use any serial device:
         if serial is None:
@@ -189,21 +292,120 @@ class SerialDevice(BaseDevice):
 
         super().__init__()
         self._port = port
+        self._low_latency = low_latency
+        self._baudrate = self.DEFAULTS['baudrate'] if baudrate is None else baudrate
+        self._quiet = quiet
+        self._fast_timeout = fast_timeout
+        self._cache_ttl = cache_ttl
+        self._keep_open = keep_open
+        self._timed_cache = dict()  # message: (monotonic() time of the answer, answer), see _cached_query
+        self._read_timeout = self.DEFAULTS['read_timeout']  # time in seconds _read waits for a response to start
+        self._inter_byte_timeout = self.DEFAULTS['inter_byte_timeout']
+        self._shared = None  # _SharedPort through which this controller talks to the device
 
     def initialize(self):
         """
-        Opens the serial port with the DEFAULTS.
+        Opens the serial port with the DEFAULTS (and the baud rate passed to the constructor, if any).
         Returns
         -------
             None
         """
-        self._rsc = serial.Serial(port=self._port,
-                                  baudrate=self.DEFAULTS['baudrate'],
-                                  timeout=self.DEFAULTS['read_timeout'],
-                                  write_timeout=self.DEFAULTS['write_timeout'])
-        sleep(0.5)
-        self.beep()
-        self._id = self.idn()
+        if self._shared is not None:
+            # Initialized already, let go of that reference first instead of taking another one that no finalize would
+            # ever drop (the port would never be closed).
+            self.finalize()
+
+        self._query_cache.clear()
+        self._timed_cache.clear()
+        self._read_timeout = self.DEFAULTS['read_timeout']
+
+        # Reuse the port if another controller has it open already, opening it a second time would fail with port busy
+        # error (or worse, both handles would race for the responses).
+        shared, fresh, idle = self._acquire(self._port, self._open_resource)
+        self._shared = shared
+        self._rsc = shared.rsc
+        self._lock = shared.lock
+        shared.approved_channels.clear()  # the user has to confirm the levels again after every (re)connect
+
+        if idle:
+            # The port was only kept open (keep_open). Whatever the device sent after the last controller finalized
+            # (e.g. a late reply) must not be taken for the response to the next query.
+            with self._lock:
+                self._rsc.reset_input_buffer()
+                shared.rx_buffer.clear()
+            if self._rsc.baudrate != self._baudrate:
+                # Nobody else uses the port. Switch it over and identify the device anew.
+                self._rsc.baudrate = self._baudrate
+                shared.id = None
+        elif not fresh and self._rsc.baudrate != self._baudrate:
+            # Reusing the port would silently talk to the device at the baud rate of the controller that opened it.
+            baudrate = self._rsc.baudrate
+            self.finalize()
+            raise ValueError(f'({self._port}) Port is already open at {baudrate} baud by another controller, can not '
+                             f'use it at {self._baudrate} baud.')
+
+        if self._low_latency:
+            self._set_low_latency()
+
+        if not fresh and shared.id is not None:
+            # The device on this port has already been woken up and identified, no need to pay for that again.
+            self._id = shared.id
+            print(f'({self._port}) Initialized resource (reusing open port):\n {self._id}')
+        else:
+            try:
+                self._identify()
+            except BaseException:
+                self.finalize()
+                raise
+            shared.id = self._id
+            print(f'({self._port}) Initialized resource:\n {self._id}')
+
+        if self._fast_timeout is not None:
+            # The device has proven to respond, don't wait the whole initial timeout for replies that won't come.
+            self._read_timeout = self._fast_timeout
+
+    def _open_resource(self):
+        """
+        Open the serial port of this controller.
+        Returns
+        -------
+            serial.Serial opened resource
+        """
+        # The serial timeout is only the inter byte timeout, _read keeps reading until its own read_timeout deadline.
+        rsc = serial.Serial(port=self._port,
+                            baudrate=self._baudrate,
+                            timeout=self._inter_byte_timeout,
+                            write_timeout=self.DEFAULTS['write_timeout'],
+                            inter_byte_timeout=self._inter_byte_timeout)
+
+        if sys.platform == 'win32' and hasattr(rsc, 'set_buffer_size'):
+            # The Windows driver buffer defaults to 4 kB, which the faster devices (e.g. Fluke 28x at 115200 baud) fill
+            # in a fraction of a second. Make room for about a second worth of data instead.
+            rsc.set_buffer_size(rx_size=max(4096, self._baudrate // 8))
+        return rsc
+
+    def _identify(self):
+        """
+        Request the device on the freshly opened port to introduce itself (into self._id) and to make a sound.
+        Returns
+        -------
+            None
+        """
+        # Instead of sleeping for the device to settle after the port was opened, ask for the id right away, but give
+        # up on the first request already after _WAKE_UP_TIME and ask once more (a device still waking up may have
+        # missed it).
+        self._read_timeout = self._WAKE_UP_TIME
+        try:
+            self._id = self.idn()
+        finally:
+            self._read_timeout = self.DEFAULTS['read_timeout']
+        if self._id == '':
+            self._id = self.idn()
+            # The first request may have been answered late rather than missed, in which case that answer was taken
+            # for this one. Drop the answer to the second request so that it is not taken for the next response.
+            sleep(self._WAKE_UP_TIME)
+            self._rsc.reset_input_buffer()
+            self._shared.rx_buffer.clear()
         if self._id == '':
             # This is a workaround because pySerial does not raise read timeout exception for some reason when you
             # query the wrong resource using read_until(). See https://github.com/pyserial/pyserial/issues/108. This
@@ -215,8 +417,123 @@ class SerialDevice(BaseDevice):
                                          f'message for this device type. In the later case please override the '
                                          f'inherited idn() method with one that uses the correct identification '
                                          f'request message.')
+        if not self._quiet:
+            self.beep()
 
-        print(f'({self._port}) Initialized resource:\n {self._id}')
+    def finalize(self):
+        """
+        Releases the serial resource. The port itself is closed only once no other controller is using it (and then
+        only if this controller was not created with keep_open).
+        Returns
+        -------
+            None
+        """
+        if self._shared is None:
+            return
+
+        self._timed_cache.clear()
+        self._shared.approved_channels.clear()
+        users_left = self._release(self._shared, self._keep_open)
+        self._shared = None
+
+        if users_left == 0 and not self._keep_open:
+            super().finalize()
+        else:
+            self._query_cache.clear()
+            self._rsc = None
+            reason = 'kept open' if users_left == 0 else 'stays open for other controllers'
+            print(f'({self._port}) Released resource (port {reason}):\n {self._id}')
+
+    @staticmethod
+    def _acquire(port, open_resource):
+        """
+        Take a reference to the _SharedPort of a port, opening the port only if no controller has it open yet.
+        Parameters
+        ----------
+        port : str
+            port name
+        open_resource : callable
+            returns a newly opened serial resource for the port
+        Returns
+        -------
+            tuple (_SharedPort, bool True if the port was just opened, bool True if it was taken from the idle ports)
+        """
+        with _PORTS_LOCK:
+            shared = _PORTS.get(port)
+            fresh = shared is None or not shared.rsc.is_open
+            if fresh:
+                shared = _SharedPort(open_resource())
+                _PORTS[port] = shared
+            idle = shared in _IDLE_PORTS
+            _IDLE_PORTS.discard(shared)
+            shared.users += 1
+        return shared, fresh, idle
+
+    @staticmethod
+    def _release(shared, keep_open=False):
+        """
+        Drop a reference taken with _acquire.
+        Parameters
+        ----------
+        shared : _SharedPort
+        keep_open : bool
+            if that was the last reference, keep the port open among the idle ports
+        Returns
+        -------
+            int number of references left, if 0 (and not keep_open) the caller has to close the resource
+        """
+        with _PORTS_LOCK:
+            shared.users -= 1
+            if shared.users == 0 and keep_open:
+                _IDLE_PORTS.add(shared)
+            return shared.users
+
+    @property
+    def read_timeout(self):
+        """ Time in seconds _read waits for a response to start arriving. """
+        return self._read_timeout
+
+    @read_timeout.setter
+    def read_timeout(self, value):
+        self._read_timeout = value
+
+    @property
+    def inter_byte_timeout(self):
+        """ Silence in seconds after which a response that has started arriving is taken as complete even without
+        read_termination. Applies to the port, so to all controllers sharing it. """
+        return self._inter_byte_timeout
+
+    @inter_byte_timeout.setter
+    def inter_byte_timeout(self, value):
+        self._inter_byte_timeout = value
+        if self._rsc is not None:
+            self._rsc.timeout = value
+            self._rsc.inter_byte_timeout = value
+
+    def _set_low_latency(self):
+        """
+        Set the ASYNC_LOW_LATENCY flag on the opened port so that the driver hands over received bytes immediately.
+        Returns
+        -------
+            None
+        """
+        try:
+            self._rsc.set_low_latency_mode(True)  # TIOCGSERIAL / TIOCSSERIAL, only implemented by posix pyserial
+        except AttributeError:
+            print(f'({self._port}) Low latency mode is not available on this platform. On Windows you can lower the '
+                  f'latency timer in the advanced port settings of the FTDI driver instead.')
+        except (ValueError, NotImplementedError) as e:
+            print(f'({self._port}) Driver refused low latency mode: {e}')
+
+        # Not every kernel version lets the FTDI driver derive its latency timer from the flag above, so set the timer
+        # itself as well (present for FTDI adapters only, writing it usually requires a udev rule or root).
+        latency_timer = f'/sys/bus/usb-serial/devices/{os.path.basename(os.path.realpath(self._port))}/latency_timer'
+        if os.path.exists(latency_timer):
+            try:
+                with open(latency_timer, 'w') as f:
+                    f.write('1')
+            except OSError as e:
+                print(f'({self._port}) Could not lower the FTDI latency timer: {e}')
 
     def idn(self):
         """
@@ -229,12 +546,13 @@ class SerialDevice(BaseDevice):
 
     def beep(self):
         """
-        Request device to make a sound.
+        Request device to make a sound. Devices do not respond to this command, so there is nothing to read (reading
+        would only wait for read_timeout). Override with a _query in devices that acknowledge it.
         Returns
         -------
             None
         """
-        self._query('SYST:BEEP')
+        self._write('SYST:BEEP')
 
     def get_input(self, channel):
         """
@@ -248,9 +566,8 @@ class SerialDevice(BaseDevice):
         -------
             str answer containing the reading
         """
-        message = 'IN:CH{}'.format(channel)
-        ans = self._query(message)
-        
+        ans = self._query(self._GET_INPUT % channel)
+
         return ans
 
     def set_output(self, channel, output_value):
@@ -266,54 +583,142 @@ class SerialDevice(BaseDevice):
         -------
             None
         """
-        message = 'OUT:CH{}:{}'.format(channel, output_value)
-        self._query(message)
+        self._query(self._SET_OUTPUT % (channel, output_value))
 
     def _write(self, message):
         """
         Write message to the resource
         Parameters
         ----------
-        message : str
-            message to be sent to the device
+        message : str or bytes
+            message to be sent to the device, bytes are expected to be already encoded (e.g. command templates)
         Returns
         -------
             None
 
         """
-        message = message + self.DEFAULTS['write_termination']
-        message = message.encode(self.DEFAULTS['encoding'])
-        self._rsc.write(message)
-
-    def _read(self):
+        if isinstance(message, str):
+            message = message.encode(self._ENC)
+        if self._timed_cache and b'?' not in message:
+            self._timed_cache.clear()  # a command may have changed whatever the cached answers describe
+        message = message + self._WTERM_B
+        with self._lock:
+            self._rsc.write(message)
+
+    def _read(self, deadline=None):
         """
         Read message from the resource
+        Parameters
+        ----------
+        deadline : float or None
+            monotonic() time after which the read gives up, defaults to read_timeout from now
         Returns
         -------
             str message returned by device
         """
-        # ans = self._rsc.readline() # readline() assumes \n as escape character causing read timeout on devices that
-        # use any other read termination character.
-        escape_char = bytes(self.DEFAULTS['read_termination'], self.DEFAULTS['encoding'])
-        ans = self._rsc.read_until(escape_char)  # ... this is why read_until is used
+        # Neither readline() (assumes \n as escape character) nor read_until() (reads one byte per system call) are
+        # used. Instead everything the driver has received so far is taken in one read, and whatever arrived after the
+        # escape character is kept in the rx_buffer for the next call (e.g. the responses following in _query_many).
+        escape_char = self._RTERM_B
+        buffer = self._shared.rx_buffer
+        if deadline is None:
+            deadline = monotonic() + self._read_timeout
+
+        end = buffer.find(escape_char)
+        while end < 0:
+            chunk = self._rsc.read(self._rsc.in_waiting or 1)  # blocks up to inter_byte_timeout if nothing is waiting
+            if chunk:
+                buffer += chunk
+                end = buffer.find(escape_char)
+            elif buffer or monotonic() > deadline:
+                # Either the response stopped arriving without its escape character (malformed reply, or one in a
+                # different termination), or it has not started before the read_timeout. Hand over whatever arrived
+                # (empty if nothing did) rather than waiting on.
+                end = len(buffer)
+                break
+
+        ans = bytes(buffer[:end])
+        del buffer[:end + len(escape_char)]
         # print(f'##### Raw answer is: {ans}') #debug only
-        ans = ans.decode(self.DEFAULTS['encoding']).strip()
+        ans = ans.decode(self._ENC).strip()
         return ans
 
+    def _read_n_lines(self, n):
+        """ Read n consecutive messages from the resource within a single read_timeout.
+        Parameters
+        ----------
+        n : int
+            number of messages to read
+        Returns
+        -------
+            list of str messages returned by device (empty strings for the ones that did not arrive in time)
+        """
+        deadline = monotonic() + self._read_timeout
+        with self._lock:
+            return [self._read(deadline) for _ in range(n)]
+
     # TODO this should be superfluous because parent implements this already, but for some reason, after removing
     #  _query from here, pyCharm checker complains that _query() 'does not return anything(?)' whenever child calls it.
     def _query(self, message):
         """ Write a message and read the response in one method.
         Parameters
         ----------
-        message : str
+        message : str or bytes
             message to send to the device
         Returns
         -------
             str whatever the output message
         """
-        self._write(message)
-        return self._read()
+        if message in self._query_cache:
+            return self._query_cache[message]
+
+        with self._lock:
+            self._write(message)
+            ans = self._read()
+
+        if message in self._CACHED_QUERIES and ans != '':  # empty answer means timeout, ask again next time
+            self._query_cache[message] = ans
+        return ans
+
+    def _cached_query(self, message, ttl):
+        """ Query the device unless it has already answered the same message less than ttl seconds ago.
+        The answers are forgotten as soon as any command (message without '?') is written to the device.
+        Parameters
+        ----------
+        message : str or bytes
+            message to send to the device
+        ttl : float
+            time in seconds for which a previous answer is reused, 0 always queries the device
+        Returns
+        -------
+            str whatever the output message
+        """
+        if ttl > 0 and message in self._timed_cache:
+            timestamp, ans = self._timed_cache[message]
+            if monotonic() - timestamp < ttl:
+                return ans
+
+        ans = self._query(message)
+        if ttl > 0 and ans != '':  # empty answer means timeout, ask again next time
+            self._timed_cache[message] = (monotonic(), ans)
+        return ans
+
+    def _query_many(self, messages):
+        """ Write several messages as one and read back all the responses in one go.
+        Every query (message containing '?') is expected to produce exactly one response per '?', other commands
+        are expected to produce none.
+        Parameters
+        ----------
+        messages : list of str or bytes
+            messages to send to the device, separated with write_termination
+        Returns
+        -------
+            list of str responses in the order of the queries
+        """
+        messages = [message.encode(self._ENC) if isinstance(message, str) else message for message in messages]
+        with self._lock:
+            self._write(self._WTERM_B.join(messages))
+            return self._read_n_lines(sum(message.count(b'?') for message in messages))
 
 
 class AgilentU12xxxDmm(SerialDevice):
@@ -327,10 +732,16 @@ class AgilentU12xxxDmm(SerialDevice):
                 'baudrate': 9600,
                 'read_timeout': 1,
                 'write_timeout': 1,
+                'inter_byte_timeout': 0.05,
                 }
 
     MAX_CHANNELS = 2
 
+    # reading and unit queries of each display, with some other DMM numbers the secondary display could be ' @2'
+    # instead of ' @3', you may have to experiment.
+    _CHANNEL_QUERIES = {1: (b'FETC?', b'CONF?'),
+                        2: (b'FETC? @3', b'CONF? @3')}
+
     def get_input(self, channel):
         """
         Get current reading
@@ -346,17 +757,11 @@ class AgilentU12xxxDmm(SerialDevice):
 
         self._channel_arg_check(channel, expected_type=int)
 
-        reading_message = 'FETC?'
-        unit_message = 'CONF?'
+        reading_message, unit_message = self._CHANNEL_QUERIES[channel]
 
-        if channel == 1:
-            pass
-        elif channel == 2:
-            reading_message += ' @3'  # with some other DMM numbers it could be ' @2', you may have to experiment.
-            unit_message += ' @3'
-
-        reading = self._query(reading_message)
-        unit = self._query(unit_message)
+        with self._lock:
+            reading = self._query(reading_message)
+            unit = self._cached_query(unit_message, self._cache_ttl)
         # output format strongly depends on device type, more here: https://sigrok.org/wiki/Agilent_U12xxx_series
 
         return reading, unit
@@ -365,7 +770,92 @@ class AgilentU12xxxDmm(SerialDevice):
         print(f'Device class {self.__class__.__name__} does not allow control of its output\n')
 
 
-class RohdeHmp4ChPsu(SerialDevice):
+class _PsuMixin:
+    """ Methods shared by the PSU controllers, mixed in before SerialDevice. Expects get_input to return the voltage
+    reading first and _get_set_voltage(channel) to return the voltage level set on a channel, as str. """
+
+    @property
+    def _approved_channels(self):
+        """ Outputs the user allowed to engage at their present levels, shared by all controllers on the port. """
+        return self._shared.approved_channels
+
+    def pre_approve(self, channels):
+        """
+        Grant permission to engage the outputs of specific channels in advance, so that engage_output does not prompt
+        for it (e.g. in scripts that run without a console). Same as answering the prompt, the approval is withdrawn
+        as soon as the output levels of the channel are changed.
+        Parameters
+        ----------
+        channels : int or tuple of ints
+            output channel(s) to approve
+        Returns
+        -------
+            None
+        """
+        if self._shared is None:
+            raise RuntimeError(f'{self.__class__.__name__} has to be initialized before its outputs can be approved, '
+                               f'initialize withdraws all approvals.')
+
+        if type(channels) is int:
+            channels = (channels,)
+
+        self._channel_arg_check(channels, expected_type=tuple)
+        self._approved_channels.update(channels)
+
+    def wait_output_stable(self, channel, tol=0.01, timeout=2.0, at_set_level=False, target=None):
+        """
+        Wait until the output of a channel settles instead of sleeping for a fixed worst-case time. The voltage
+        reading returned by get_input is polled with exponential backoff starting at 10 ms, until two successive
+        readings differ by less than tol. Readings that time out or are not numeric count as not stable yet.
+        Parameters
+        ----------
+        channel : int
+            channel number
+        tol : float
+            largest change between successive readings (and from the set level or target) which is considered stable
+        timeout : float
+            time in seconds after which waiting is abandoned
+        at_set_level : bool
+            also require the reading to be within tol of the voltage set on the channel. Use it right after
+            engage_output, where two 0 V readings taken before the output starts to ramp would pass for stable.
+        target : float
+            voltage the reading has to come within tol of instead of the set level, e.g. 0 after disengage_output,
+            where two readings of a slowly discharging output would pass for stable long before it reaches 0 V.
+        Returns
+        -------
+            bool True if the output settled, False if timeout was reached first
+        """
+        if at_set_level and target is not None:
+            raise ValueError('Pass either at_set_level or target, not both.')
+
+        deadline = monotonic() + timeout
+        interval = 0.01
+        with_target = at_set_level or target is not None
+        previous = None
+
+        while True:
+            if at_set_level and target is None:
+                target = self._reading_to_float(self._get_set_voltage(channel))
+            reading = self._reading_to_float(self.get_input(channel)[0])
+            if (reading is not None and previous is not None and abs(reading - previous) < tol
+                    and (not with_target or (target is not None and abs(reading - target) < tol))):
+                return True
+            previous = reading
+            if monotonic() + interval > deadline:
+                return False
+            sleep(interval)
+            interval = min(2 * interval, 0.05)
+
+    @staticmethod
+    def _reading_to_float(reading):
+        """ float of a reading, None if it is empty (timed out) or not numeric. """
+        try:
+            return float(reading)
+        except ValueError:
+            return None
+
+
+class RohdeHmp4ChPsu(_PsuMixin, SerialDevice):
     """
     Rohde & Shwarz HMP4000 basic controller
     """
@@ -375,10 +865,46 @@ class RohdeHmp4ChPsu(SerialDevice):
                 'baudrate': 9600,
                 'read_timeout': 1,
                 'write_timeout': 1,
+                'inter_byte_timeout': 0.05,
                 }
 
     MAX_CHANNELS = 4
 
+    # encoded command templates of the hot paths, complete them with the % operator
+    _SEL_CHANNEL = b'INST:NSEL %d'
+    _MEAS_VOLT = b'MEAS:VOLT?'
+    _MEAS_CURR = b'MEAS:CURR?'
+    _ACTIVATE_CHANNEL = b'OUTP:SEL 1'
+    _DEACTIVATE_CHANNEL = b'OUTP:SEL 0'
+    _OUTPUTS_ON = b'OUTP:GEN 1'
+    _OUTPUTS_OFF = b'OUTP:GEN 0'
+
+    @classmethod
+    def _encode_messages(cls):
+        # This device does not accept semicolon separated commands, so channel selection and levels go on separate
+        # lines of a single message.
+        cls._SET_LEVELS = cls._WTERM_B.join((cls._SEL_CHANNEL, b'VOLT %f', b'CURR %f'))
+        # The shut down message is the same every time, build it once per class so that the safety relevant path
+        # does no formatting at all.
+        cls._SHUTDOWN = cls._OUTPUTS_OFF + cls._WTERM_B + cls._deactivation_message(range(1, cls.MAX_CHANNELS+1))
+
+    @classmethod
+    def _deactivation_message(cls, channels):
+        """
+        Build the message that deactivates channels.
+        Parameters
+        ----------
+        channels - iterable of int
+            numbers of channels
+        Returns
+        -------
+            bytes message without the final write termination
+        """
+        messages = []
+        for channel in channels:
+            messages.extend((cls._SEL_CHANNEL % channel, cls._DEACTIVATE_CHANNEL))
+        return cls._WTERM_B.join(messages)
+
     def initialize(self):
         super().initialize()
         self._disengage_all_outputs()
@@ -396,12 +922,15 @@ class RohdeHmp4ChPsu(SerialDevice):
         """
         self._channel_arg_check(channel, expected_type=int)
 
-        self._write(f'INST:NSEL {str(channel)}')
-        voltage = self._query('MEAS:VOLT?')
-        current = self._query('MEAS:CURR?')
+        # both queries go out together with the channel selection, so the two responses follow each other directly
+        voltage, current = self._query_many([self._SEL_CHANNEL % channel, self._MEAS_VOLT, self._MEAS_CURR])
 
         return voltage, 'Volt', current, 'Amp'
 
+    def _get_set_voltage(self, channel):
+        """ Query the voltage level set on a channel (see wait_output_stable). """
+        return self._query_many([self._SEL_CHANNEL % channel, b'VOLT?'])[0]
+
     def set_output(self, channel, voltage=0.0, current=0.0):
         """
         Set output voltage and current limits at a specific channel
@@ -415,19 +944,66 @@ class RohdeHmp4ChPsu(SerialDevice):
         channel : int
             channel number
         voltage : float
-            channel voltage limit in volts
+            channel voltage limit in volts, a number or numeric str (converted with float()), sent
+            rounded to 6 decimals
         current : float
-            channel current limit in ampere
+            channel current limit in ampere, a number or numeric str (converted with float()), sent
+            rounded to 6 decimals
         Returns
         -------
             None
         """
         self._channel_arg_check(channel, expected_type=int)
 
-        self._write(f'INST:NSEL {str(channel)}')
-        # set output levels
-        self._write(f"VOLT {str(voltage)}{self.DEFAULTS['write_termination']}CURR {str(current)}")
-        # TODO second write termination missing?
+        self._approved_channels.discard(channel)  # user has not seen the new levels yet
+        # channel selection and output levels go out in one write, _write terminates the last line
+        self._write(self._SET_LEVELS % (channel, float(voltage), float(current)))
+
+    def get_inputs(self, channels):
+        """
+        Get voltage and current readings from several channels in a single write.
+        Parameters
+        ----------
+        channels : int or tuple of ints
+            channel number(s)
+        Returns
+        -------
+            dict of channel number to tuple of strings as returned by get_input
+        """
+        if type(channels) is int:
+            channels = (channels,)
+
+        self._channel_arg_check(channels, expected_type=tuple)
+
+        messages = []
+        for channel in channels:
+            messages.extend((self._SEL_CHANNEL % channel, self._MEAS_VOLT, self._MEAS_CURR))
+        readings = self._query_many(messages)
+
+        return {channel: (readings[2*i], 'Volt', readings[2*i+1], 'Amp') for i, channel in enumerate(channels)}
+
+    def set_outputs(self, channel_map):
+        """
+        Set output voltage and current limits at several channels in a single write.
+
+        NOTE: the same precautions as for set_output apply.
+
+        Parameters
+        ----------
+        channel_map : dict
+            channel number as key and tuple of (voltage, current) limits as value, e.g. {1: (1.2, 0.01)}, the limits are
+            converted with float() and sent rounded to 6 decimals (see set_output)
+        Returns
+        -------
+            None
+        """
+        self._channel_arg_check(tuple(channel_map), expected_type=tuple)
+
+        # This device does not accept semicolon separated commands, so each one goes on its own line (see
+        # _encode_messages).
+        self._approved_channels.difference_update(channel_map)
+        self._write(self._WTERM_B.join(self._SET_LEVELS % (channel, float(voltage), float(current))
+                                       for channel, (voltage, current) in channel_map.items()))
 
     def engage_output(self, channels, seek_permission=True):
         """
@@ -453,23 +1029,26 @@ class RohdeHmp4ChPsu(SerialDevice):
         self.disengage_output()
         self._activate_channels(channels)
 
-        if seek_permission:
-            print(f'\nDevice {self._id}:\n requesting persmission to engage outputs->')
-            for channel in channels:
-                # select channel
-                self._write(f'INST:NSEL {str(channel)}')
-                # query input level settings to inform user prior to seeking permission.
-                sel_voltage = self._query('VOLT?')
-                sel_current = self._query('CURR?')
-                print(f'  Ch:{channel} @: {sel_voltage} Volt / {sel_current} Amp')       
-            
-            usr_ans = input(f' Are you sure you want to proceed?[y/n] > ')
+        if seek_permission and not self._approved_channels.issuperset(channels):
+            # one prompt on the console at a time, also when several devices are engaged from different threads
+            with _PROMPT_LOCK:
+                print(f'\nDevice {self._id}:\n requesting persmission to engage outputs->')
+                # query input level settings of all channels at once to inform user prior to seeking permission.
+                messages = []
+                for channel in channels:
+                    messages.extend((self._SEL_CHANNEL % channel, b'VOLT?', b'CURR?'))
+                levels = self._query_many(messages)
+                print('\n'.join(f'  Ch:{channel} @: {levels[2*i]} Volt / {levels[2*i+1]} Amp'
+                                for i, channel in enumerate(channels)))
+
+                usr_ans = input(f' Are you sure you want to proceed?[y/n] > ')
             if usr_ans.lower() != 'y':
                 print('   Skipping outputs engage.\n')
                 self.disengage_output()  # TODO perhaps this is too conservative/unnecesssary, conisder removing.
                 return 0
+            self._approved_channels.update(channels)
             
-        self._write('OUTP:GEN 1')
+        self._write(self._OUTPUTS_ON)
         return 1
         
     def _deactivate_channels(self, channels=tuple(range(1, MAX_CHANNELS+1))):
@@ -484,19 +1063,15 @@ class RohdeHmp4ChPsu(SerialDevice):
             None
         """
 
-        long_msg = []
-        for channel in channels:
-            long_msg.append(f'INST:NSEL {str(channel)}{self.DEFAULTS["write_termination"]}OUTP:SEL 0'
-                            f'{self.DEFAULTS["write_termination"]}')
-            #  This is a workaround to get the selected channels to shut down as much together as possible (separate
-            #  queries can take long and that can lead to in-between outputs state that user may not expect).
-            #  SCPI standard allows to separate commands with semicolon (;) to send more commands in a single message
-            #  but this device does not seem to support that.
-        self._write("".join(long_msg))
+        #  This is a workaround to get the selected channels to shut down as much together as possible (separate
+        #  queries can take long and that can lead to in-between outputs state that user may not expect).
+        #  SCPI standard allows to separate commands with semicolon (;) to send more commands in a single message
+        #  but this device does not seem to support that, so the commands are sent as lines of a single message.
+        self._write(self._deactivation_message(channels))
     
     def _activate_channels(self, channels=tuple(range(1, MAX_CHANNELS+1))):
         """
-        Activate all channels one by one.
+        Activate all channels in a single message (same as _deactivate_channels).
         Parameters
         ----------
         channels - tuple
@@ -506,11 +1081,10 @@ class RohdeHmp4ChPsu(SerialDevice):
         None
         """
 
+        messages = []
         for channel in channels:
-            # select channel
-            self._write(f'INST:NSEL {str(channel)}')
-            # activate channel
-            self._write('OUTP:SEL 1')
+            messages.extend((self._SEL_CHANNEL % channel, self._ACTIVATE_CHANNEL))
+        self._write(self._WTERM_B.join(messages))
 
     def disengage_output(self, channels='all'):
         """
@@ -539,13 +1113,12 @@ class RohdeHmp4ChPsu(SerialDevice):
 
     def _disengage_all_outputs(self):
         """
-        Shuts down all outputs at once and subsequently deactivates all channels.
+        Shuts down all outputs at once and subsequently deactivates all channels (in the same message).
         Returns
         -------
             None
         """
-        self._write('OUTP:GEN 0')  # immediate shut down of all outputs
-        self._deactivate_channels()
+        self._write(self._SHUTDOWN)  # immediate shut down of all outputs, followed by deactivation of the channels
 
 
 class RohdeHmp3ChPsu(RohdeHmp4ChPsu):
@@ -573,10 +1146,21 @@ class Fluke28xDmm(SerialDevice):
                 'baudrate': 115200,
                 'read_timeout': 1,
                 'write_timeout': 1,
+                'inter_byte_timeout': 0.05,
                 }
 
     MAX_CHANNELS = 1
 
+    def beep(self):
+        """
+        This device has no beep command, but it acknowledges every command (unknown ones too), so the acknowledgement
+        has to be read or it would be taken for the response to the next query.
+        Returns
+        -------
+            None
+        """
+        self._query('SYST:BEEP')
+
     def idn(self):
         """
         Query device identification number.
@@ -584,8 +1168,10 @@ class Fluke28xDmm(SerialDevice):
         -------
             str identification of the device
         """
-        self._query('ID')  # First portion of the message is just confirmation if query was understood (0 or 1)
-        ans = self._read()  # Next part is the actual ID info
+        # First portion of the message is just confirmation if query was understood (0 or 1), next is the actual ID info
+        with self._lock:
+            self._write('ID')
+            ack, ans = self._read_n_lines(2)
         return ans
 
     def get_input(self, channel=1):
@@ -601,12 +1187,13 @@ class Fluke28xDmm(SerialDevice):
             tuple of strings with measurement reading and device specific representation of the unit
         """
         self._channel_arg_check(channel, expected_type=int)
-        self._query('QM')
-        ans = self._read()
-        print(f'ans: {ans}')
-        ans_list = [item.strip() for item in ans.split(',')]
-        reading = ans_list[0]
-        unit = ans_list[1]
+        with self._lock:
+            self._write('QM')
+            ack, ans = self._read_n_lines(2)
+        # the response is <reading>,<unit>,<state>,<attribute>, only the first two fields are split off and stripped
+        reading, unit = ans.split(',', 2)[:2]
+        reading = reading.strip()
+        unit = unit.strip()
 
         return reading, unit
 
@@ -614,7 +1201,7 @@ class Fluke28xDmm(SerialDevice):
         print(f'Device class {self.__class__.__name__} does not allow control of its output.\n')
 
 
-class Tti3ChPsu(SerialDevice):
+class Tti3ChPsu(_PsuMixin, SerialDevice):
     """
     TTI 3 channel PSU basic controller
     """
@@ -624,10 +1211,21 @@ class Tti3ChPsu(SerialDevice):
                 'baudrate': 9600,
                 'read_timeout': 1,
                 'write_timeout': 1,
+                'inter_byte_timeout': 0.05,
                 }
 
     MAX_CHANNELS = 3
 
+    # encoded command templates of the hot paths, complete them with the % operator
+    _SET_LEVELS = b'V%d %f;I%d %f'
+    _MEAS_VOLT = b'V%dO?'
+    _MEAS_CURR = b'I%dO?'
+    _GET_VOLT = b'V%d?'
+    _GET_CURR = b'I%d?'
+    _OUTPUT_ON = b'OP%d 1'
+    _OUTPUT_OFF = b'OP%d 0'
+    _OUTPUTS_OFF = b'OPALL 0'
+
     def initialize(self):
         super().initialize()
         self._disengage_all_outputs()
@@ -646,10 +1244,13 @@ class Tti3ChPsu(SerialDevice):
 
         self._channel_arg_check(channel, expected_type=int)
 
-        voltage = self._query(f'V{str(channel)}O?')[:-1]
-        current = self._query(f'I{str(channel)}O?')[:-1]
+        voltage, current = self._query_many([self._MEAS_VOLT % channel + b';' + self._MEAS_CURR % channel])
 
-        return voltage, 'Volt', current, 'Amp'
+        return voltage[:-1], 'Volt', current[:-1], 'Amp'
+
+    def _get_set_voltage(self, channel):
+        """ Query the voltage level set on a channel (see wait_output_stable), the response is V<n> <nr2>. """
+        return self._query(self._GET_VOLT % channel)[3:]
 
     def set_output(self, channel, voltage=0.0, current=0.0):
         """
@@ -664,17 +1265,64 @@ class Tti3ChPsu(SerialDevice):
         channel : int
             channel number(s)
         voltage : float
-            channel voltage limit in volts
+            channel voltage limit in volts, a number or numeric str (converted with float()), sent
+            rounded to 6 decimals
         current : float
-            channel current limit in ampere
+            channel current limit in ampere, a number or numeric str (converted with float()), sent
+            rounded to 6 decimals
         Returns
         -------
             None
         """
 
         self._channel_arg_check(channel, expected_type=int)
+        self._approved_channels.discard(channel)  # user has not seen the new levels yet
         # set output levels
-        self._write(f'V{str(channel)} {str(voltage)};I{str(channel)} {str(current)}')
+        self._write(self._SET_LEVELS % (channel, float(voltage), channel, float(current)))
+
+    def get_inputs(self, channels):
+        """
+        Get voltage and current readings from several channels with a single compound query.
+        Parameters
+        ----------
+        channels : int or tuple of ints
+            channel number(s)
+        Returns
+        -------
+            dict of channel number to tuple of strings as returned by get_input
+        """
+        if type(channels) is int:
+            channels = (channels,)
+
+        self._channel_arg_check(channels, expected_type=tuple)
+
+        # each of the compounded queries is answered with its own response message
+        readings = self._query_many([b';'.join(self._MEAS_VOLT % channel + b';' + self._MEAS_CURR % channel
+                                               for channel in channels)])
+
+        return {channel: (readings[2*i][:-1], 'Volt', readings[2*i+1][:-1], 'Amp')
+                for i, channel in enumerate(channels)}
+
+    def set_outputs(self, channel_map):
+        """
+        Set output voltage and current limits at several channels with a single compound command.
+
+        NOTE: the same precautions as for set_output apply.
+
+        Parameters
+        ----------
+        channel_map : dict
+            channel number as key and tuple of (voltage, current) limits as value, e.g. {1: (1.2, 0.01)}, the limits are
+            converted with float() and sent rounded to 6 decimals (see set_output)
+        Returns
+        -------
+            None
+        """
+        self._channel_arg_check(tuple(channel_map), expected_type=tuple)
+
+        self._approved_channels.difference_update(channel_map)
+        self._write(b';'.join(self._SET_LEVELS % (channel, float(voltage), channel, float(current))
+                              for channel, (voltage, current) in channel_map.items()))
 
     def engage_output(self, channels, seek_permission=True):
         """
@@ -699,32 +1347,29 @@ class Tti3ChPsu(SerialDevice):
 
         self.disengage_output()
 
-        if seek_permission:
+        if seek_permission and not self._approved_channels.issuperset(channels):
             # TODO: below code is near identical for both PSU classes. Perhaps it would be worthwhile to unify by
             #  calling get_input instead of _query and def a dedicated SerialDevice method (i.e.
             #  _get_permission_to_engage()). Downside is that each device will return a little different string
             #  formatting for voltage and current.
-            print(f'\nDevice {self._id}:\n requesting persmission to engage outputs->')
-            for channel in channels:
-    
-                # query input level settings to inform user prior to seeking permission.
-                # The response is V <n> <nr2> where <nr2> is in Volts
-                sel_voltage = self._query(f'V{str(channel)}?')[3:]
-                sel_current = self._query(f'I{str(channel)}?')[3:]
-                print(f'  Ch:{channel} @: {sel_voltage} Volt / {sel_current} Amp')
-
-            usr_ans = input(f' Are you sure you want to proceed?[y/n] > ')
+            with _PROMPT_LOCK:  # see RohdeHmp4ChPsu.engage_output
+                print(f'\nDevice {self._id}:\n requesting persmission to engage outputs->')
+                # query input level settings of all channels with one compound query to inform user prior to seeking
+                # permission. The responses are V<n> <nr2> where <nr2> is in Volts (I<n> <nr2> in Amps)
+                levels = self._query_many([b';'.join(self._GET_VOLT % channel + b';' + self._GET_CURR % channel
+                                                     for channel in channels)])
+                print('\n'.join(f'  Ch:{channel} @: {levels[2*i][3:]} Volt / {levels[2*i+1][3:]} Amp'
+                                for i, channel in enumerate(channels)))
+
+                usr_ans = input(f' Are you sure you want to proceed?[y/n] > ')
             if usr_ans.lower() != 'y':
                 print('   Skipping outputs engage.\n')
                 self.disengage_output()  # TODO perhaps this is too conservative/unnecessary, consider removing.
                 return 0
+            self._approved_channels.update(channels)
         
         # construct one message with request to engage each of the channels:
-        long_msg = []
-        for channel in channels:
-            long_msg.append(f'OP{str(channel)} 1;')
-
-        self._write("".join(long_msg))
+        self._write(b';'.join(self._OUTPUT_ON % channel for channel in channels))
         return 1
 
     def disengage_output(self, channels='all'):
@@ -751,11 +1396,7 @@ class Tti3ChPsu(SerialDevice):
         if channels == tuple(range(1, self.MAX_CHANNELS+1)):
             self._disengage_all_outputs()
         else:  # deactivate only the the specific outputs, all in one command
-            long_msg = []
-            for channel in channels:
-                long_msg.append(f'OP{str(channel)} 0;')
-                
-            self._write("".join(long_msg))
+            self._write(b';'.join(self._OUTPUT_OFF % channel for channel in channels))
 
     def _disengage_all_outputs(self):
         """
@@ -764,7 +1405,7 @@ class Tti3ChPsu(SerialDevice):
         -------
             None
         """
-        self._write('OPALL 0')  # immediate shut down of all outputs
+        self._write(self._OUTPUTS_OFF)  # immediate shut down of all outputs
 
 
 class Tti2ChPsu(Tti3ChPsu):
@@ -791,6 +1432,7 @@ class TtiQL2ChPsu(Tti2ChPsu):
                 'baudrate': 19200,  # QL series is fixed at higher baud rate by default
                 'read_timeout': 1,
                 'write_timeout': 1,
+                'inter_byte_timeout': 0.05,
                 }
 
 
@@ -805,10 +1447,12 @@ class GlOpticTouch(BaseDevice):
 
     DEFAULTS = {'write_prefix': '<',
                 'write_termination': ' />',
+                'read_termination': '</measurement>',  # closing tag of the response root element
                 'encoding': 'ascii',
                 "HOST": '127.0.0.1',
                 "PORT": 12001,
                 "read_buffer": 32768,
+                "so_rcvbuf": 1 << 20,  # kernel receive buffer of the socket, on Linux capped by net.core.rmem_max
                 "timeout": 20,  # this value has to be kept long since extremely dimm light sources can cause very
                 # lengthy auto integration time and in these cases you have to wait long for the result (
                 # experimentally up to about 15s)
@@ -817,14 +1461,34 @@ class GlOpticTouch(BaseDevice):
 
     # PORT: Same port that GL SPECTROSOFT establishes (use netstat in case its different in case of your equipment)
 
+    # encoded DEFAULTS used by every exchange, recomputed by __init_subclass__ for subclasses with their own DEFAULTS
+    _ENC = DEFAULTS['encoding']
+    _WPREFIX_B = DEFAULTS['write_prefix'].encode(_ENC)
+    _WTERM_B = DEFAULTS['write_termination'].encode(_ENC)
+    _RTERM_B = DEFAULTS['read_termination'].encode(_ENC)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._ENC = cls.DEFAULTS['encoding']
+        cls._WPREFIX_B = cls.DEFAULTS['write_prefix'].encode(cls._ENC)
+        cls._WTERM_B = cls.DEFAULTS['write_termination'].encode(cls._ENC)
+        cls._RTERM_B = cls.DEFAULTS['read_termination'].encode(cls._ENC)
+
     def __init__(self):
 
         super().__init__()
 
-        self.xml_dump_file_name = None  # if overwritten with str file dumping with that str in file name as prefix
-        # will be dumped for every measurement. If user specifies any other type it will be ignored.
-        # TODO: implement as _xml... and set up decorated setter and getter with @property and
-        #  @xml_dump_file_name.setter, although at this point it appears as unnecessary boilerplate...
+        self._xml_dump_file_name = None  # see xml_dump_file_name
+        self._xml_dump_prefix = None  # file name prefix of the dumps without .xml extension, None if not dumping
+        self.numeric_spectrum = False  # if True, get_input returns spectrum_x and spectrum_y as numpy float arrays
+        # instead of lists of strings (or as array.array('d') if numpy is not installed).
+        self.spectrum_dtype = 'float64'  # dtype of the numeric spectra, 'float32' halves their size and still holds
+        # more digits than the spectrometer resolves.
+        self._rx_buffer = bytearray()  # receive buffer reused by every _read, allocated in initialize
+        # lxml parsers can be reused (but not shared between threads, this one is used under self._lock only), the
+        # stdlib parser can not and a new one is created by fromstring every time.
+        self._parser = et.XMLParser(remove_blank_text=True, collect_ids=False) if lxml_found else None
+        self._meas_request = (None, b'')  # DEFAULTS['meas_request'] together with its encoded message (see get_input)
 
     def initialize(self):
 
@@ -839,6 +1503,12 @@ class GlOpticTouch(BaseDevice):
                                          'is runnning in the background.\n(NOTE: you need a hardware USB key to run '
                                          'SpectroSoft)')
 
+        # the measurement request is one small write, send it right away instead of letting Nagle's algorithm hold it
+        spectrosoft_client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        spectrosoft_client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # room for a whole response in the kernel buffer while the spectrum is being received
+        spectrosoft_client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.DEFAULTS['so_rcvbuf'])
+
         host, port = spectrosoft_client_socket.getpeername()
         
         print(f'Connected to SpectroSoft host ({host}) at port {port}.')
@@ -846,21 +1516,66 @@ class GlOpticTouch(BaseDevice):
         self._id = host
         self._port = port
         self._rsc = spectrosoft_client_socket
+        self._rx_buffer = bytearray(self.DEFAULTS['read_buffer'])
+
+    @property
+    def xml_dump_file_name(self):
+        """ If set to str, the response of every measurement is dumped into a file with that str as file name prefix
+        (followed by a timestamp). If user specifies any other type it will be ignored. """
+        return self._xml_dump_file_name
+
+    @xml_dump_file_name.setter
+    def xml_dump_file_name(self, value):
+        self._xml_dump_file_name = value
+        if type(value) is str:
+            # strip('.xml') would strip any of the characters '.', 'x', 'm' and 'l' from both ends of the prefix
+            self._xml_dump_prefix = value[:-len('.xml')] if value.endswith('.xml') else value
+        else:
+            self._xml_dump_prefix = None
+
+    def idn(self):
+        """ SpectroSoft has no identification request, the address of the host it runs on is used instead. """
+        return self._id
+
+    def beep(self):
+        """ There is no separate beep request, SpectroSoft beeps with every measurement (see DEFAULTS) """
+        pass
+
+    def _query(self, message):
+        with self._lock:
+            self._write(message)
+            return self._read()
 
     def _write(self, message):
-        message = self.DEFAULTS['write_prefix'] + message + self.DEFAULTS['write_termination']
-        message = message.encode(self.DEFAULTS['encoding'])
-        self._rsc.sendall(message)
+        self._rsc.sendall(self._WPREFIX_B + message.encode(self._ENC) + self._WTERM_B)
 
     def _read(self):
-        # data returned by recv is readily an xml format string
+        # data returned by recv is readily an xml format string, but a response of tens of kB does not necessarily
+        # arrive with a single recv. Keep receiving into the preallocated buffer until the closing root tag shows up.
+        termination = self._RTERM_B
+        size = 0
+        end = -1
         try:
-            gl_xml_string = self._rsc.recv(self.DEFAULTS['read_buffer'])
+            while end < 0:
+                if size == len(self._rx_buffer):  # response is larger than read_buffer, make room for the rest
+                    self._rx_buffer.extend(bytes(self.DEFAULTS['read_buffer']))
+                with memoryview(self._rx_buffer)[size:] as free:
+                    received = self._rsc.recv_into(free)
+                if received == 0:
+                    raise ConnectionError('SpectroSoft closed the connection before the measurement data was complete.')
+                # only the new data (and the tail a split tag could start in) has to be searched
+                end = self._rx_buffer.find(termination, max(0, size - len(termination)), size + received)
+                size += received
         except socket.timeout:
             raise socket.timeout('Could not obtain measurement data from spectrometer.\n Please check the USB '
                                  'connection between PC and the Spectrometer.')
-        
-        return self._parse_xml_to_dict(gl_xml_string, xml_dump=self.xml_dump_file_name)
+
+        # slicing the bytearray itself would copy the response twice (to a new bytearray, then to bytes)
+        with memoryview(self._rx_buffer)[:size] as response:
+            xml_string = bytes(response)
+
+        return self._parse_xml_to_dict(xml_string, xml_dump=self._xml_dump_prefix, parser=self._parser,
+                                       numeric=self.numeric_spectrum, dtype=self.spectrum_dtype)
 
     def get_input(self, *args):
         """ Trigger and return measurement output in form of results dictionary
@@ -869,7 +1584,13 @@ class GlOpticTouch(BaseDevice):
         ----------
         *args : int channel - optional channel argument (here unused)
         """
-        return self._query(self.DEFAULTS['meas_request'])
+        request = self.DEFAULTS['meas_request']
+        if request is not self._meas_request[0]:  # only encoded again once the user has modified the request
+            self._meas_request = (request, self._WPREFIX_B + request.encode(self._ENC) + self._WTERM_B)
+
+        with self._lock:
+            self._rsc.sendall(self._meas_request[1])
+            return self._read()
 
     def set_output(self, *args):
         """
@@ -888,34 +1609,64 @@ class GlOpticTouch(BaseDevice):
         # TODO The measurement message could be modified by this interface without any actual communications here.
 
     @staticmethod
-    def _parse_xml_to_dict(xml_string, xml_dump=False):
-        root = et.fromstring(xml_string)
+    def _parse_xml_to_dict(xml_string, xml_dump=None, parser=None, numeric=False, dtype='float64'):
+        """
+        Flatten the xml measurement response of SpectroSoft to a dict (see HW manuals/gl_parsing_result.txt).
+        Parameters
+        ----------
+        xml_string : bytes
+            the response
+        xml_dump : str
+            file name prefix (without .xml extension) of a file to dump the response into, no dump if None
+        parser : XMLParser
+            parser to reuse (lxml only), a new one is used if None
+        numeric : bool
+            convert spectrum_x and spectrum_y to numpy float arrays (array.array('d') if numpy is not installed)
+        dtype : str
+            'float64' or 'float32', element type of the numeric spectra
+        Returns
+        -------
+            dict with results, status and data entries
+        """
+        root = et.fromstring(xml_string, parser)
 
-        if type(xml_dump) is str:
-            date_str = datetime.now().strftime("%Y_%m_%d_%H%M%S")
-            file_name = xml_dump.strip('.xml') + date_str + '.xml'
-            et.ElementTree(root).write(file_name)
+        if xml_dump is not None:
+            file_name = xml_dump + strftime("%Y_%m_%d_%H%M%S") + '.xml'
+            with open(file_name, 'wb') as f:  # the response as received, no need to serialize the parsed tree again
+                f.write(xml_string)
 
         ans_dict = dict(results=dict(), status=dict(), data=dict(spectrum_x=[], spectrum_y=[]))
 
         # flatten the data structure to name attributes only (caption atrributes are not very readable and contain
         # unusual complex characters)
         for parameter in root.find('status'):
-            ans_dict['status'][parameter.attrib.get('name')] = parameter.text
-
-        # collect tagged data
-        data = root.find('data')
-        for parameter in data:
-            # Avoid creating 'row' key entry as that would contain only the first found row (and there are many)...
-            if parameter.tag != 'row':
-                ans_dict['data'][parameter.tag] = parameter.attrib
-
-        for row in data.findall('row'):  # ...instead append all row elements into lists.
-            ans_dict['data']['spectrum_x'].append(row.attrib.get('wavelength'))
-            ans_dict['data']['spectrum_y'].append(row.attrib.get('value'))
+            ans_dict['status'][parameter.get('name')] = parameter.text
+
+        # collect tagged data in a single pass over the data element
+        spectrum_x = ans_dict['data']['spectrum_x']
+        spectrum_y = ans_dict['data']['spectrum_y']
+        for parameter in root.find('data'):
+            # Avoid creating 'row' key entry as that would contain only the first found row (and there are many),
+            # instead append all row elements into lists.
+            if parameter.tag == 'row':
+                spectrum_x.append(parameter.get('wavelength'))
+                spectrum_y.append(parameter.get('value'))
+            else:
+                ans_dict['data'][parameter.tag] = dict(parameter.attrib)  # lxml attrib is a live view of the element
+
+        if numeric:
+            if np is not None:
+                # one vectorized string to float conversion per axis instead of a Python loop over the rows
+                ans_dict['data']['spectrum_x'] = np.asarray(spectrum_x, dtype=dtype)
+                ans_dict['data']['spectrum_y'] = np.asarray(spectrum_y, dtype=dtype)
+            else:
+                # typed arrays of C floats instead of lists of float objects (np.frombuffer can wrap them later)
+                typecode = 'f' if dtype == 'float32' else 'd'
+                ans_dict['data']['spectrum_x'] = array(typecode, map(float, spectrum_x))
+                ans_dict['data']['spectrum_y'] = array(typecode, map(float, spectrum_y))
 
         for parameter in root.find('results'):
-            ans_dict['results'][parameter.attrib.get('name')] = parameter.text
+            ans_dict['results'][parameter.get('name')] = parameter.text
 
         # TODO some of the items under 'results' have non obvious name attribute. Perhaps their content can be copied
         #  to additional entries with more friendly names (e.g. results_dict["Y"] = results_dict["luminous_flux"]),
@@ -925,5 +1676,81 @@ class GlOpticTouch(BaseDevice):
         return ans_dict
 
 
+def close_idle_ports():
+    """
+    Close the serial ports that controllers created with keep_open have left open without users. Called at interpreter
+    exit too, call it directly when a port has to be really closed before that (e.g. to reopen it with another program).
+    Returns
+    -------
+        None
+    """
+    with _PORTS_LOCK:  # held while closing, so that no controller picks up a port that is about to be closed
+        for shared in _IDLE_PORTS:
+            shared.rsc.close()
+        _IDLE_PORTS.clear()
+
+
+atexit.register(close_idle_ports)
+
+
+@contextmanager
+def open_instruments(*devices):
+    """
+    Initialize several devices and keep them connected for the whole with block, so that a sequence of measurements
+    does not pay for opening and closing the ports each time. All devices that were initialized are finalized on
+    exit, also when initialization of one of the later ones fails.
+    Parameters
+    ----------
+    devices : BaseDevice
+        device instances (not yet initialized)
+    Returns
+    -------
+        tuple of the initialized devices in the order in which they were passed
+    """
+    with ExitStack() as stack:
+        yield tuple(stack.enter_context(device) for device in devices)
+
+
+class AsyncDevice:
+    """
+    Awaitable front end for any device, for use in asyncio programs. Every method of the wrapped device becomes a
+    coroutine running the blocking method in an executor, so that e.g. asyncio.gather(dmm.get_input(1),
+    psu.get_input(1)) overlaps the round-trips of the two devices. Exchanges with one device stay serialized by its
+    lock. The same goes for the permission prompt of engage_output, the event loop keeps servicing the other devices
+    while the user makes up their mind.
+    Parameters
+    ----------
+    device : BaseDevice
+        device instance to wrap
+    executor : concurrent.futures.Executor
+        executor running the blocking calls, the default executor of the event loop is used if None
+    """
+
+    def __init__(self, device, executor=None):
+        self._device = device
+        self._executor = executor
+
+    def __str__(self):
+        return str(self._device)
+
+    async def __aenter__(self):
+        await self.initialize()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.finalize()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._device, name)
+        if not callable(attribute):
+            return attribute
+
+        async def method(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(attribute, *args, **kwargs))
+
+        return method
+
+
 if __name__ == '__main__':
     pass